@@ -4,20 +4,38 @@ A powerful web scraping and analysis agent for company research
 """
 
 import asyncio
-import json
+import hashlib
 import os
+import re
+import time
 import uuid
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Optional
-from urllib.parse import urljoin, urlparse
+from urllib.parse import unquote, urljoin, urlparse
 
 import httpx
+import lxml.html
+import orjson
+import redis.asyncio as redis
+import tldextract
 from bs4 import BeautifulSoup
+from lxml import etree
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
 from dotenv import load_dotenv
 
+# Optional semantic cache dependencies
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    faiss = None
+
 load_dotenv()
 
 app = FastAPI(
@@ -34,9 +52,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for research jobs (use Redis/DB in production)
+# Research jobs live in Redis hashes when REDIS_URL is set, otherwise in-process
+JOB_TTL = 86400
 research_jobs = {}
 
+# Report token streams for jobs whose report is still being generated
+report_streams = {}
+
+# Progress updates are coalesced and written at most once per flush interval
+PROGRESS_FLUSH_INTERVAL = 0.2
+_pending_progress = {}
+_progress_flushes = {}
+
+# Shared LLM API clients, opened on startup and closed on shutdown
+_ANTHROPIC_CLIENT: Optional[httpx.AsyncClient] = None
+_OPENAI_CLIENT: Optional[httpx.AsyncClient] = None
+
+# LLM response cache. Exact matches live in Redis when REDIS_URL is set, otherwise
+# in-process. Near-duplicate prompts are matched by embedding similarity when the
+# optional semantic cache dependencies are installed.
+LLM_CACHE_TTL = 86400
+LLM_CACHE_MAX_ENTRIES = 1024
+SEMANTIC_CACHE_MODEL = "all-MiniLM-L6-v2"
+# The model truncates at 256 word pieces, so longer prompts are embedded in chunks
+SEMANTIC_CACHE_CHUNK_WORDS = 128
+# Map step replies are keyed by page URL, so only the reduce step reuses near matches
+SEMANTIC_CACHE_THRESHOLDS = {
+    "categorize": 0.99
+}
+_REDIS_CLIENT: Optional[redis.Redis] = None
+_EMBEDDER = None
+_llm_cache = {}
+_semantic_indexes = {}
+
+# Without an API key the providers return placeholder replies, which are never cached
+PROVIDER_API_KEYS = {
+    "anthropic": "ANTHROPIC_API_KEY",
+    "openai": "OPENAI_API_KEY"
+}
+
+# Response bodies above this size are decoded in a worker thread
+LARGE_RESPONSE_BYTES = 50_000
+
 
 class ResearchRequest(BaseModel):
     website_url: HttpUrl
@@ -62,8 +119,43 @@ class ResearchJob(BaseModel):
     completed_at: Optional[str] = None
 
 
-# Model configurations with descriptions
-MODEL_OPTIONS = {
+class ReportStream:
+    """Append-only report tokens that every listener replays from the start"""
+
+    def __init__(self):
+        self.tokens = []
+        self.closed = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, token: str):
+        async with self._changed:
+            self.tokens.append(token)
+            self._changed.notify_all()
+
+    async def close(self):
+        async with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+
+    async def listen(self):
+        """Yield every token published so far, then new ones until the stream is closed"""
+        offset = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: offset < len(self.tokens) or self.closed)
+                tokens = self.tokens[offset:]
+                closed = self.closed
+
+            offset += len(tokens)
+            for token in tokens:
+                yield token
+
+            if closed:
+                return
+
+
+# Model configurations with descriptions (read-only)
+MODEL_OPTIONS = MappingProxyType({
     "claude-sonnet-4-20250514": {
         "name": "Claude Sonnet 4",
         "provider": "anthropic",
@@ -104,9 +196,70 @@ MODEL_OPTIONS = {
         "context_window": 128000,
         "cost_tier": "low"
     }
+})
+
+# Links to common non-content pages that the crawler skips
+_SKIP_RE = re.compile(r"login|signup|cart|checkout|#|javascript:|mailto:", re.I)
+
+# Public suffix parsing from the bundled snapshot, so crawls never fetch the list over the network.
+# Private suffixes (github.io, vercel.app, ...) keep each hosted site separate from its neighbours.
+_TLD_EXTRACT = tldextract.TLDExtract(suffix_list_urls=(), include_psl_private_domains=True)
+
+# Bytes of HTML read per page before the rest of the body is discarded
+MAX_PAGE_BYTES = 200_000
+
+# Pages sampled to detect boilerplate lines repeated across a site
+BOILERPLATE_SAMPLE_PAGES = 5
+
+# Output token budget for map-step batches, which grows with the number of questions
+MAP_TOKENS_PER_PAGE = 500
+MAP_TOKENS_PER_QUESTION = 80
+MAP_MAX_OUTPUT_TOKENS = 8192
+
+# Cheaper models used for simple per-page stages, keyed by provider
+TIER_MAP = {
+    "anthropic": {"cheap": "claude-haiku-4-20250514"},
+    "openai": {"cheap": "gpt-4o-mini"}
 }
 
 
+@app.on_event("startup")
+async def open_llm_clients():
+    """Create pooled HTTP clients for the LLM providers"""
+    global _ANTHROPIC_CLIENT, _OPENAI_CLIENT
+    _ANTHROPIC_CLIENT = httpx.AsyncClient(
+        base_url="https://api.anthropic.com",
+        timeout=120.0,
+        http2=True
+    )
+    _OPENAI_CLIENT = httpx.AsyncClient(
+        base_url="https://api.openai.com",
+        timeout=120.0,
+        http2=True
+    )
+
+
+@app.on_event("startup")
+async def open_llm_cache():
+    """Connect the response cache backends"""
+    global _REDIS_CLIENT, _EMBEDDER
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        _REDIS_CLIENT = redis.from_url(redis_url, decode_responses=True)
+    if faiss is not None:
+        _EMBEDDER = await asyncio.to_thread(SentenceTransformer, SEMANTIC_CACHE_MODEL)
+
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """Close the pooled LLM HTTP clients"""
+    for client in (_ANTHROPIC_CLIENT, _OPENAI_CLIENT):
+        if client is not None:
+            await client.aclose()
+    if _REDIS_CLIENT is not None:
+        await _REDIS_CLIENT.aclose()
+
+
 @app.get("/")
 async def root():
     return {"message": "Deep Research Agent API", "version": "1.0.0"}
@@ -115,7 +268,7 @@ async def root():
 @app.get("/models")
 async def get_models():
     """Get available LLM models with descriptions"""
-    return MODEL_OPTIONS
+    return dict(MODEL_OPTIONS)
 
 
 @app.post("/research", response_model=dict)
@@ -133,7 +286,9 @@ async def start_research(request: ResearchRequest, background_tasks: BackgroundT
         created_at=datetime.utcnow().isoformat()
     )
 
-    research_jobs[job_id] = job.model_dump()
+    # Register the stream before the job is visible so stream requests never miss it
+    report_streams[job_id] = ReportStream()
+    await update_job(job_id, job.model_dump())
 
     # Start background processing
     background_tasks.add_task(
@@ -152,18 +307,49 @@ async def start_research(request: ResearchRequest, background_tasks: BackgroundT
 @app.get("/research/{job_id}")
 async def get_research_status(job_id: str):
     """Get the status of a research job"""
-    if job_id not in research_jobs:
+    job = await get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    return research_jobs[job_id]
+    return job
+
+
+@app.get("/research/{job_id}/stream")
+async def stream_research_report(job_id: str):
+    """Stream report tokens as server-sent events while the report is generated"""
+    # Look the stream up first: the pipeline saves the report before dropping the
+    # stream, so a job loaded after a miss already has it
+    stream = report_streams.get(job_id)
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if stream is None and job["status"] not in ("completed", "failed", "cancelled"):
+        # Tokens are only published in the process running the pipeline
+        raise HTTPException(
+            status_code=409,
+            detail="Report stream is only available from the worker running this job"
+        )
+
+    async def event_stream():
+        if stream is None:
+            # Report already finished, send it in one event
+            report = job.get("report")
+            if report:
+                yield f"data: {orjson.dumps(report).decode()}\n\n"
+        else:
+            async for token in stream.listen():
+                yield f"data: {orjson.dumps(token).decode()}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @app.delete("/research/{job_id}")
 async def cancel_research(job_id: str):
     """Cancel a research job"""
-    if job_id not in research_jobs:
+    if await get_job(job_id) is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    research_jobs[job_id]["status"] = "cancelled"
+    await update_job(job_id, {"status": "cancelled"})
     return {"message": "Job cancelled"}
 
 
@@ -176,212 +362,533 @@ async def run_research_pipeline(
         max_depth: int
 ):
     """Main research pipeline"""
+    # Resolve the provider once; unknown models fall back to the default model's provider
+    model_config = MODEL_OPTIONS.get(model) or MODEL_OPTIONS["claude-sonnet-4-20250514"]
+    provider = model_config["provider"]
+
     try:
         # Update status
-        update_job_progress(job_id, "scraping", 5, "Starting web scraping...")
+        await update_job_progress(job_id, "scraping", 5, "Starting web scraping...")
 
         # Step 1: Scrape the website
         pages = await scrape_website(job_id, website_url, max_pages, max_depth)
-        research_jobs[job_id]["pages_scraped"] = pages
+        # The job record only keeps page metadata; raw content is just for the summarizer
+        await update_job(job_id, {
+            "pages_scraped": [{k: v for k, v in page.items() if k != "content"} for page in pages]
+        })
 
         if not pages:
             raise Exception("No pages could be scraped from the website")
 
-        update_job_progress(job_id, "summarizing", 30, f"Scraped {len(pages)} pages. Generating summaries...")
+        await update_job_progress(job_id, "summarizing", 30, f"Scraped {len(pages)} pages. Generating summaries...")
 
-        # Step 2: Generate summaries for each page
-        summaries = await generate_summaries(job_id, pages, model)
-        research_jobs[job_id]["summaries"] = summaries
+        # Step 2: Summarize pages in batches and rate their relevance to each question
+        summaries = await generate_summaries(job_id, pages, questions, model, provider)
+        await update_job(job_id, {"summaries": summaries})
 
-        update_job_progress(job_id, "categorizing", 60, "Categorizing content by questions...")
+        # Raw page content is no longer needed once pages are summarized
+        for page in pages:
+            page.pop("content", None)
 
-        # Step 3: Categorize content by questions
-        categorized = await categorize_by_questions(job_id, summaries, questions, model)
-        research_jobs[job_id]["categorized_data"] = categorized
+        await update_job_progress(job_id, "categorizing", 60, "Categorizing content by questions...")
 
-        update_job_progress(job_id, "reporting", 80, "Generating final report...")
+        # Step 3: Merge per-page relevance into findings per question
+        categorized = await categorize_by_questions(job_id, summaries, questions, model, provider)
+        await update_job(job_id, {"categorized_data": categorized})
+
+        await update_job_progress(job_id, "reporting", 80, "Generating final report...")
 
         # Step 4: Generate final report
-        report = await generate_report(job_id, categorized, questions, website_url, model)
-        research_jobs[job_id]["report"] = report
+        report = await generate_report(job_id, categorized, questions, website_url, model, provider)
+        await update_job(job_id, {"report": report})
 
         # Complete
-        research_jobs[job_id]["status"] = "completed"
-        research_jobs[job_id]["progress"] = {"stage": "complete", "percent": 100, "message": "Research complete!"}
-        research_jobs[job_id]["completed_at"] = datetime.utcnow().isoformat()
+        await update_job(job_id, {
+            "status": "completed",
+            "progress": {"stage": "complete", "percent": 100, "message": "Research complete!"},
+            "completed_at": datetime.utcnow().isoformat()
+        })
 
     except Exception as e:
-        research_jobs[job_id]["status"] = "failed"
-        research_jobs[job_id]["error"] = str(e)
-        research_jobs[job_id]["progress"] = {"stage": "error", "percent": 0, "message": str(e)}
+        await update_job(job_id, {
+            "status": "failed",
+            "error": str(e),
+            "progress": {"stage": "error", "percent": 0, "message": str(e)}
+        })
+
+    finally:
+        # Close the report stream so listeners stop waiting
+        stream = report_streams.pop(job_id, None)
+        if stream is not None:
+            await stream.close()
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """Load a research job, or None if it does not exist"""
+    if _REDIS_CLIENT is not None:
+        fields = await _REDIS_CLIENT.hgetall(f"job:{job_id}")
+        return {field: orjson.loads(value) for field, value in fields.items()} or None
+    return research_jobs.get(job_id)
+
+
+async def update_job(job_id: str, fields: dict):
+    """Create or update fields of a research job"""
+    if "progress" in fields or "status" in fields:
+        # Make sure a debounced progress write can't land after this one
+        await settle_job_progress(job_id)
+    await write_job(job_id, fields)
+
+
+async def write_job(job_id: str, fields: dict):
+    """Write research job fields to the job store"""
+    if _REDIS_CLIENT is not None:
+        # One hash field per job field, so updates don't reserialize the whole job
+        key = f"job:{job_id}"
+        async with _REDIS_CLIENT.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={field: orjson.dumps(value) for field, value in fields.items()})
+            pipe.expire(key, JOB_TTL)
+            await pipe.execute()
+    else:
+        research_jobs.setdefault(job_id, {}).update(fields)
 
 
-def update_job_progress(job_id: str, stage: str, percent: int, message: str):
-    """Update job progress"""
-    if job_id in research_jobs:
-        research_jobs[job_id]["progress"] = {
+async def update_job_progress(job_id: str, stage: str, percent: int, message: str):
+    """Update job progress, coalescing updates within the flush interval into one write"""
+    fields = {
+        "progress": {
             "stage": stage,
             "percent": percent,
             "message": message
-        }
-        research_jobs[job_id]["status"] = "processing"
+        },
+        "status": "processing"
+    }
 
+    if job_id in _pending_progress:
+        handle, _ = _pending_progress[job_id]
+    else:
+        handle = asyncio.get_running_loop().call_later(PROGRESS_FLUSH_INTERVAL, flush_job_progress, job_id)
+    _pending_progress[job_id] = (handle, fields)
 
-async def scrape_website(job_id: str, base_url: str, max_pages: int, max_depth: int) -> list[dict]:
-    """Scrape website pages recursively"""
-    visited = set()
-    pages = []
-    base_domain = urlparse(base_url).netloc
 
-    async def scrape_page(url: str, depth: int):
-        if depth > max_depth or len(pages) >= max_pages or url in visited:
-            return
+def flush_job_progress(job_id: str):
+    """Write the latest pending progress update for a job"""
+    _, fields = _pending_progress.pop(job_id)
+    task = asyncio.create_task(write_job(job_id, fields))
+    _progress_flushes[job_id] = task
+
+    def forget(done_task: asyncio.Task):
+        if _progress_flushes.get(job_id) is done_task:
+            del _progress_flushes[job_id]
 
-        visited.add(url)
+    task.add_done_callback(forget)
 
+
+async def settle_job_progress(job_id: str):
+    """Drop any pending progress update and wait for an in-flight flush"""
+    pending = _pending_progress.pop(job_id, None)
+    if pending is not None:
+        pending[0].cancel()
+
+    task = _progress_flushes.get(job_id)
+    if task is not None:
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def parse_html(content: bytes, url: str, encoding: Optional[str] = None) -> dict:
+    """Extract title, meta description, text and links from an HTML document"""
+    parser = None
+    if encoding:
+        # Honour the HTTP charset; the size cap can split a multibyte character
         try:
-            async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-                response = await client.get(url, headers={
-                    "User-Agent": "Mozilla/5.0 (compatible; DeepResearchAgent/1.0)"
-                })
+            content = content.decode(encoding, errors="replace").encode("utf-8")
+            encoding = "utf-8"
+            parser = lxml.html.HTMLParser(encoding=encoding)
+        except LookupError:
+            encoding = None
+
+    try:
+        tree = lxml.html.fromstring(content, parser=parser)
+    except etree.ParserError:
+        return parse_html_fallback(content, url, encoding)
+
+    # Remove script and style elements
+    etree.strip_elements(tree, "script", "style", "nav", "footer", "header", with_tail=False)
+
+    text = "\n".join(chunk.strip() for chunk in tree.itertext() if chunk.strip())
+
+    return {
+        "title": (tree.findtext(".//title") or "").strip() or url,
+        "meta_description": tree.xpath('string(//meta[@name="description"]/@content)', smart_strings=False),
+        "text": text,
+        "links": tree.xpath("//a/@href", smart_strings=False)
+    }
+
+
+def parse_html_fallback(content: bytes, url: str, encoding: Optional[str] = None) -> dict:
+    """Parse documents lxml rejects with BeautifulSoup"""
+    soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+
+    for element in soup(["script", "style", "nav", "footer", "header"]):
+        element.decompose()
+
+    meta_tag = soup.find("meta", attrs={"name": "description"})
+
+    return {
+        "title": soup.title.string if soup.title and soup.title.string else url,
+        "meta_description": meta_tag.get("content", "") if meta_tag else "",
+        "text": soup.get_text(separator="\n", strip=True),
+        "links": [link["href"] for link in soup.find_all("a", href=True)]
+    }
+
+
+@lru_cache(maxsize=4096)
+def url_host(url: str) -> str:
+    """Network location of a URL"""
+    return urlparse(url).netloc
+
+
+def normalize_url(url) -> str:
+    """Comparable form of a URL: lowercase scheme and host, decoded path, no fragment or trailing slash"""
+    if not isinstance(url, str):
+        return ""
+    parsed = urlparse(url.strip())
+    path = unquote(parsed.path).rstrip("/")
+    query = f"?{unquote(parsed.query)}" if parsed.query else ""
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}{query}"
 
-                if response.status_code != 200:
-                    return
 
-                content_type = response.headers.get("content-type", "")
-                if "text/html" not in content_type:
-                    return
+@lru_cache(maxsize=4096)
+def registered_domain(host: str) -> str:
+    """Registered domain (eTLD+1) of a host, or the host itself for IPs and local names"""
+    return _TLD_EXTRACT(host).registered_domain or host
 
-                soup = BeautifulSoup(response.text, "html.parser")
 
-                # Remove script and style elements
-                for element in soup(["script", "style", "nav", "footer", "header"]):
-                    element.decompose()
+def content_shingles(text: str, size: int = 5) -> set[int]:
+    """Hash every run of size consecutive words for near-duplicate detection"""
+    # Windows start at every word, so insertions only change the shingles around them
+    words = text.split()
+    return {hash(tuple(words[i:i + size])) for i in range(max(len(words) - size, 0) + 1)}
 
-                # Extract text content
-                text = soup.get_text(separator="\n", strip=True)
 
-                # Get title
-                title = soup.title.string if soup.title else url
+def jaccard_similarity(a: set, b: set) -> float:
+    """Jaccard similarity of two sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
 
-                # Get meta description
-                meta_desc = ""
-                meta_tag = soup.find("meta", attrs={"name": "description"})
-                if meta_tag:
-                    meta_desc = meta_tag.get("content", "")
+
+async def scrape_website(
+        job_id: str,
+        base_url: str,
+        max_pages: int,
+        max_depth: int,
+        num_workers: int = 32
+) -> list[dict]:
+    """Scrape website pages breadth-first with a pool of workers draining a shared queue"""
+    visited = {base_url}
+    pages = []
+    pages_lock = asyncio.Lock()
+    done = asyncio.Event()
+    base_domain = registered_domain(url_host(base_url))
+    seen_digests = set()
+    seen_shingles = []
+    boilerplate_lines = set()
+
+    queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
+    queue.put_nowait((base_url, 0))
+
+    async def scrape_page(url: str, depth: int, client: httpx.AsyncClient):
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                return
+
+            content_type = response.headers.get("content-type", "")
+            if "text/html" not in content_type:
+                return
+
+            encoding = response.charset_encoding
+
+            # Stop reading once there is enough HTML for the title, meta and text we keep
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= MAX_PAGE_BYTES:
+                    break
+
+        parsed_page = parse_html(bytes(body), url, encoding)
+        text = parsed_page["text"]
+
+        async with pages_lock:
+            if len(pages) >= max_pages:
+                done.set()
+                return
+
+            # Drop lines shared by every one of the first pages (site-wide boilerplate)
+            if boilerplate_lines:
+                text = "\n".join(line for line in text.split("\n") if line not in boilerplate_lines)
+
+            # Skip exact and near-duplicate pages so they aren't sent to the LLM
+            digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+            shingles = content_shingles(text)
+            is_duplicate = digest in seen_digests or any(
+                jaccard_similarity(shingles, previous) > 0.85 for previous in seen_shingles
+            )
+
+            if not is_duplicate:
+                seen_digests.add(digest)
+                seen_shingles.append(shingles)
 
                 pages.append({
                     "url": url,
-                    "title": title,
-                    "meta_description": meta_desc,
-                    "content": text[:50000],  # Limit content size
+                    "title": parsed_page["title"],
+                    "meta_description": parsed_page["meta_description"],
+                    "content": text[:10_000],  # Only this much is sent to the summarizer
+                    "content_length": len(text),
                     "depth": depth
                 })
 
-                update_job_progress(
-                    job_id, "scraping",
-                    min(25, 5 + len(pages)),
-                    f"Scraped {len(pages)} pages..."
-                )
+                if len(pages) == BOILERPLATE_SAMPLE_PAGES:
+                    boilerplate_lines.update(set.intersection(*(
+                        set(page["content"].split("\n")) for page in pages
+                    )))
 
-                # Find links to follow
-                if depth < max_depth:
-                    links = soup.find_all("a", href=True)
-                    tasks = []
+                if len(pages) >= max_pages:
+                    done.set()
 
-                    for link in links:
-                        href = link["href"]
-                        full_url = urljoin(url, href)
-                        parsed = urlparse(full_url)
+        if not is_duplicate:
+            await update_job_progress(
+                job_id, "scraping",
+                min(25, 5 + len(pages)),
+                f"Scraped {len(pages)} pages..."
+            )
 
-                        # Only follow links on same domain
-                        if parsed.netloc == base_domain and full_url not in visited:
-                            # Skip common non-content pages
-                            skip_patterns = ["login", "signup", "cart", "checkout", "#", "javascript:", "mailto:"]
-                            if not any(p in full_url.lower() for p in skip_patterns):
-                                tasks.append(scrape_page(full_url, depth + 1))
+        # Queue links to follow
+        if depth < max_depth and not done.is_set():
+            for href in parsed_page["links"]:
+                full_url = urljoin(url, href)
+
+                # Only follow links on the same site (subdomains included), skipping common non-content pages
+                if full_url in visited or _SKIP_RE.search(full_url):
+                    continue
+                if registered_domain(url_host(full_url)) == base_domain:
+                    visited.add(full_url)
+                    queue.put_nowait((full_url, depth + 1))
+
+    async def worker(client: httpx.AsyncClient):
+        while True:
+            url, depth = await queue.get()
+            try:
+                if not done.is_set():
+                    await scrape_page(url, depth, client)
+            except Exception as e:
+                print(f"Error scraping {url}: {e}")
+            finally:
+                queue.task_done()
+
+    # One pooled client for the whole crawl so connections are reused across pages
+    async with httpx.AsyncClient(
+            timeout=30.0,
+            follow_redirects=True,
+            http2=True,
+            headers={"User-Agent": "Mozilla/5.0 (compatible; DeepResearchAgent/1.0)"},
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64)
+    ) as client:
+        workers = [asyncio.create_task(worker(client)) for _ in range(num_workers)]
+
+        # Stop once the page budget is reached or there is nothing left to crawl
+        waiters = [asyncio.create_task(queue.join()), asyncio.create_task(done.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in workers + waiters:
+            task.cancel()
+        await asyncio.gather(*workers, *waiters, return_exceptions=True)
 
-                    if tasks:
-                        await asyncio.gather(*tasks[:10])  # Limit concurrent requests
+    return pages
 
-        except Exception as e:
-            print(f"Error scraping {url}: {e}")
 
-    await scrape_page(base_url, 0)
-    return pages
+async def generate_summaries(
+        job_id: str,
+        pages: list[dict],
+        questions: list[str],
+        model: str,
+        provider: str,
+        batch_size: int = 5,
+        max_concurrency: int = 8
+) -> list[dict]:
+    """Map step: summarize pages in batches and rate each page against every question"""
+    # Per-page summaries are simple enough for the provider's cheap tier
+    summary_model = TIER_MAP[provider]["cheap"]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    progress_lock = asyncio.Lock()
+    completed = 0
 
+    questions_text = "\n".join([f"{i + 1}. {q}" for i, q in enumerate(questions)])
 
-async def generate_summaries(job_id: str, pages: list[dict], model: str) -> list[dict]:
-    """Generate summaries for each page using LLM"""
-    summaries = []
-    model_config = MODEL_OPTIONS.get(model, MODEL_OPTIONS["claude-sonnet-4-20250514"])
+    # Shrink batches so every page's summary and ratings fit in the output budget
+    page_tokens = MAP_TOKENS_PER_PAGE + MAP_TOKENS_PER_QUESTION * len(questions)
+    batch_size = max(1, min(batch_size, MAP_MAX_OUTPUT_TOKENS // page_tokens))
+
+    # Instructions and questions are the same for every batch, so they lead the prompt
+    # as a cacheable prefix and only the page contents vary between calls
+    summary_instructions = f"""Summarize each of the webpages below and assess its relevance to each research question.
+
+For each page provide:
+1. A concise summary (under 300 words) highlighting the main topic/purpose, key facts and data points, and important details or claims
+2. For each question, how relevant the page is (high/medium/low/none) and the key information it contains for that question
+
+Respond with a JSON array containing one object per page, in the order given:
+[
+    {{
+        "url": "page url",
+        "title": "page title",
+        "summary": "concise summary of the page",
+        "per_question_relevance": [
+            {{
+                "question": 1,
+                "relevance": "high/medium/low/none",
+                "key_info": "information from the page relevant to the question"
+            }}
+        ]
+    }}
+]
 
-    for i, page in enumerate(pages):
-        try:
-            summary = await call_llm(
-                model=model,
-                provider=model_config["provider"],
-                system="You are a research assistant. Summarize the webpage content concisely, focusing on key information, facts, and data points. Keep summaries under 500 words.",
-                prompt=f"""Summarize this webpage:
-
-Title: {page['title']}
-URL: {page['url']}
-
-Content:
-{page['content'][:10000]}
-
-Provide a concise summary highlighting:
-1. Main topic/purpose
-2. Key facts and data points
-3. Important details or claims
-"""
-            )
+RESEARCH QUESTIONS:
+{questions_text}
 
-            summaries.append({
-                "url": page["url"],
-                "title": page["title"],
-                "summary": summary,
-                "original_length": len(page["content"])
-            })
+"""
 
-            progress = 30 + int((i / len(pages)) * 30)
-            update_job_progress(job_id, "summarizing", progress, f"Summarized {i + 1}/{len(pages)} pages...")
+    async def map_batch(batch: list[dict]) -> list[dict]:
+        nonlocal completed
+
+        pages_text = "\n\n".join([
+            f"--- Page {i + 1} ---\nTitle: {page['title']}\nURL: {page['url']}\n\nContent:\n{page['content'][:10000]}"
+            for i, page in enumerate(batch)
+        ])
+
+        async with semaphore:
+            try:
+                response = await call_llm(
+                    model=summary_model,
+                    provider=provider,
+                    max_tokens=min(len(batch) * page_tokens, MAP_MAX_OUTPUT_TOKENS),
+                    system="You are a research assistant. Summarize webpage content concisely, focusing on key information, facts, and data points, and judge how relevant each page is to the research questions. Always respond with valid JSON.",
+                    prompt=f"""WEBPAGES:
+{pages_text}
+""",
+                    prefix=summary_instructions
+                )
 
-        except Exception as e:
-            summaries.append({
+                # The character scan is pure Python, keep it off the event loop
+                items = await asyncio.to_thread(extract_json, response, "[", "]")
+
+                if not isinstance(items, list) and (len(batch) == 1 or not os.getenv(PROVIDER_API_KEYS[provider])):
+                    # A plain-text reply (or a demo placeholder) can only be about the page(s) sent
+                    results = [{"summary": response.strip(), "per_question_relevance": []} for _ in batch]
+                else:
+                    items = [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+                    # Models often echo URLs with a trailing slash, fragment or different escaping
+                    by_url = {normalize_url(item.get("url")): item for item in items}
+
+                    results = []
+                    for page in batch:
+                        # Only trust items the model attributed to this page
+                        item = by_url.get(normalize_url(page["url"]), {})
+                        results.append({
+                            "summary": item.get("summary") or "Error generating summary: page missing from model response",
+                            "per_question_relevance": item.get("per_question_relevance") or []
+                        })
+            except Exception as e:
+                results = [
+                    {"summary": f"Error generating summary: {str(e)}", "per_question_relevance": []}
+                    for _ in batch
+                ]
+
+        async with progress_lock:
+            completed += len(batch)
+            progress = 30 + int((completed / len(pages)) * 30)
+            await update_job_progress(job_id, "summarizing", progress, f"Summarized {completed}/{len(pages)} pages...")
+
+        return [
+            {
                 "url": page["url"],
                 "title": page["title"],
-                "summary": f"Error generating summary: {str(e)}",
-                "original_length": len(page["content"])
-            })
-
-    return summaries
+                "summary": result["summary"],
+                "per_question_relevance": result["per_question_relevance"],
+                "original_length": page["content_length"]
+            }
+            for page, result in zip(batch, results)
+        ]
+
+    batches = [pages[i:i + batch_size] for i in range(0, len(pages), batch_size)]
+    mapped = await asyncio.gather(*(map_batch(batch) for batch in batches))
+    return [summary for batch in mapped for summary in batch]
+
+
+def extract_json(text: str, opening: str = "{", closing: str = "}"):
+    """Parse the first balanced, valid JSON object (or array) in text, ignoring brackets inside strings"""
+    start = text.find(opening)
+
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == opening:
+                depth += 1
+            elif char == closing:
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return orjson.loads(text[start:i + 1])
+                    except orjson.JSONDecodeError:
+                        break
+
+        # Unbalanced or invalid candidate (a stray bracket in prose): retry from the next opening
+        start = text.find(opening, start + 1)
+
+    return None
 
 
 async def categorize_by_questions(
         job_id: str,
         summaries: list[dict],
         questions: list[str],
-        model: str
+        model: str,
+        provider: str
 ) -> dict:
-    """Categorize page summaries by relevance to each question"""
-    model_config = MODEL_OPTIONS.get(model, MODEL_OPTIONS["claude-sonnet-4-20250514"])
+    """Reduce step: merge per-page relevance from the map step into findings per question"""
+
+    # Group the map step's per-page notes under the question they relate to
+    findings = {i: [] for i in range(len(questions))}
+    for s in summaries:
+        for rating in s.get("per_question_relevance", []):
+            try:
+                index = int(rating.get("question")) - 1
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if index in findings and rating.get("relevance", "none") != "none":
+                findings[index].append(
+                    f"- {s['title']} ({s['url']}) [{rating.get('relevance')}]: {rating.get('key_info', '')}"
+                )
 
-    # Prepare summaries text
-    summaries_text = "\n\n".join([
-        f"Page: {s['title']}\nURL: {s['url']}\nSummary: {s['summary']}"
-        for s in summaries
+    findings_text = "\n\n".join([
+        f"{i + 1}. {q}\n" + ("\n".join(findings[i]) or "- No relevant pages found")
+        for i, q in enumerate(questions)
     ])
 
-    questions_text = "\n".join([f"{i + 1}. {q}" for i, q in enumerate(questions)])
-
-    categorization_prompt = f"""Analyze these webpage summaries and categorize them by relevance to each research question.
-
-RESEARCH QUESTIONS:
-{questions_text}
-
-WEBPAGE SUMMARIES:
-{summaries_text}
+    # Static instructions go first so providers can cache the shared prefix
+    categorization_instructions = """Merge the per-page findings below into a categorized analysis for each research question.
 
 For each question, identify:
 1. Which pages are most relevant
@@ -389,45 +896,48 @@ For each question, identify:
 3. A confidence score (high/medium/low) for the available information
 
 Respond in JSON format:
-{{
+{
     "questions": [
-        {{
+        {
             "question": "question text",
             "relevant_pages": [
-                {{
+                {
                     "url": "page url",
                     "title": "page title", 
                     "relevance": "high/medium/low",
                     "key_info": "extracted relevant information"
-                }}
+                }
             ],
             "summary": "overall summary of findings for this question",
             "confidence": "high/medium/low",
             "data_gaps": "what information is missing or unclear"
-        }}
+        }
     ]
-}}
+}
+
+"""
+
+    categorization_prompt = f"""FINDINGS BY QUESTION:
+{findings_text}
 """
 
     try:
         response = await call_llm(
             model=model,
-            provider=model_config["provider"],
+            provider=provider,
+            stage="categorize",
+            # Findings for different question lists must never be served for each other
+            cache_scope="\n".join(questions),
             system="You are a research analyst. Categorize and analyze content with precision. Always respond with valid JSON.",
-            prompt=categorization_prompt
+            prompt=categorization_prompt,
+            prefix=categorization_instructions
         )
 
-        # Parse JSON response
-        # Find JSON in response
-        json_start = response.find("{")
-        json_end = response.rfind("}") + 1
-        if json_start != -1 and json_end > json_start:
-            categorized = json.loads(response[json_start:json_end])
-        else:
-            categorized = {"questions": [], "error": "Could not parse categorization"}
+        # Parse the JSON object out of the response
+        categorized = await asyncio.to_thread(extract_json, response)
+        if not isinstance(categorized, dict):
+            categorized = {"questions": [], "error": "Could not parse categorization", "raw_response": response}
 
-    except json.JSONDecodeError:
-        categorized = {"questions": [], "raw_response": response}
     except Exception as e:
         categorized = {"questions": [], "error": str(e)}
 
@@ -439,18 +949,13 @@ async def generate_report(
         categorized: dict,
         questions: list[str],
         website_url: str,
-        model: str
+        model: str,
+        provider: str
 ) -> str:
     """Generate final research report"""
-    model_config = MODEL_OPTIONS.get(model, MODEL_OPTIONS["claude-sonnet-4-20250514"])
 
-    report_prompt = f"""Generate a comprehensive research report based on the analysis of {website_url}.
-
-RESEARCH QUESTIONS:
-{chr(10).join([f'{i + 1}. {q}' for i, q in enumerate(questions)])}
-
-CATEGORIZED FINDINGS:
-{json.dumps(categorized, indent=2)}
+    # Static instructions go first so providers can cache the shared prefix
+    report_instructions = """Generate a comprehensive research report from the research questions and categorized findings below.
 
 Create a professional research report with:
 1. Executive Summary - Key findings overview
@@ -464,87 +969,358 @@ Create a professional research report with:
 
 Use clear formatting with headers and bullet points where appropriate.
 Cite specific pages/URLs when referencing information.
+
 """
 
-    report = await call_llm(
-        model=model,
-        provider=model_config["provider"],
-        system="You are a senior research analyst. Write clear, professional reports with actionable insights. Use markdown formatting.",
-        prompt=report_prompt
-    )
+    report_prompt = f"""WEBSITE ANALYZED: {website_url}
+
+RESEARCH QUESTIONS:
+{chr(10).join([f'{i + 1}. {q}' for i, q in enumerate(questions)])}
+
+CATEGORIZED FINDINGS:
+{orjson.dumps(categorized, option=orjson.OPT_INDENT_2).decode()}
+"""
+
+    # Forward report tokens to any client listening on the job's stream
+    stream = report_streams.get(job_id)
+    chunks = []
+    async for token in stream_llm(
+            model=model,
+            provider=provider,
+            system="You are a senior research analyst. Write clear, professional reports with actionable insights. Use markdown formatting.",
+            prompt=report_prompt,
+            prefix=report_instructions
+    ):
+        chunks.append(token)
+        if stream is not None:
+            await stream.publish(token)
+
+    return "".join(chunks)
+
+
+async def cache_get(key: str) -> Optional[str]:
+    """Look up an exact-match cached LLM response"""
+    if _REDIS_CLIENT is not None:
+        return await _REDIS_CLIENT.get(f"llm:{key}")
+
+    entry = _llm_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    _llm_cache.pop(key, None)
+    return None
+
+
+async def cache_set(key: str, response: str):
+    """Store an LLM response for exact-match lookups"""
+    if _REDIS_CLIENT is not None:
+        await _REDIS_CLIENT.setex(f"llm:{key}", LLM_CACHE_TTL, response)
+    else:
+        # Entries share one TTL, so insertion order is expiry order: evict from the front
+        now = time.monotonic()
+        _llm_cache.pop(key, None)
+        while _llm_cache:
+            oldest = next(iter(_llm_cache))
+            if _llm_cache[oldest][0] > now and len(_llm_cache) < LLM_CACHE_MAX_ENTRIES:
+                break
+            del _llm_cache[oldest]
+        _llm_cache[key] = (now + LLM_CACHE_TTL, response)
+
+
+def prune_semantic_cache():
+    """Drop expired semantic cache entries, and namespaces left empty"""
+    now = time.monotonic()
+    for namespace in list(_semantic_indexes):
+        index, entries = _semantic_indexes[namespace]
+        expired = 0
+        while expired < len(entries) and entries[expired][0] <= now:
+            expired += 1
+        if expired == len(entries):
+            del _semantic_indexes[namespace]
+        elif expired:
+            # Removing ids from a flat index renumbers the rest, matching the entries list
+            index.remove_ids(np.arange(expired, dtype=np.int64))
+            del entries[:expired]
+
+
+def embed_prompt(prompt: str):
+    """Embed the whole prompt as the normalized mean of its chunk embeddings"""
+    words = prompt.split()
+    chunks = [
+        " ".join(words[i:i + SEMANTIC_CACHE_CHUNK_WORDS])
+        for i in range(0, len(words), SEMANTIC_CACHE_CHUNK_WORDS)
+    ] or [prompt]
+    embedding = _EMBEDDER.encode(chunks, normalize_embeddings=True).mean(axis=0, keepdims=True)
+    return (embedding / np.linalg.norm(embedding)).astype(np.float32)
+
+
+def semantic_cache_search(namespace: str, embedding, threshold: float) -> Optional[str]:
+    """Return the cached response of the most similar previous prompt above threshold"""
+    prune_semantic_cache()
+    if namespace not in _semantic_indexes:
+        return None
+
+    index, entries = _semantic_indexes[namespace]
+    scores, ids = index.search(embedding, 1)
+    if ids[0][0] != -1 and scores[0][0] > threshold:
+        return entries[ids[0][0]][1]
+    return None
+
+
+def semantic_cache_add(namespace: str, embedding, response: str):
+    """Index a prompt embedding against its response"""
+    prune_semantic_cache()
+    if namespace not in _semantic_indexes:
+        _semantic_indexes[namespace] = (faiss.IndexFlatIP(embedding.shape[1]), [])
+
+    index, entries = _semantic_indexes[namespace]
+    if len(entries) >= LLM_CACHE_MAX_ENTRIES:
+        index.remove_ids(np.arange(1, dtype=np.int64))
+        del entries[0]
+    index.add(embedding)
+    entries.append((time.monotonic() + LLM_CACHE_TTL, response))
+
+
+async def call_llm(
+        model: str,
+        provider: str,
+        system: str,
+        prompt: str,
+        stage: Optional[str] = None,
+        prefix: str = "",
+        max_tokens: int = 4096,
+        cache_scope: str = ""
+) -> str:
+    """Call LLM API based on provider, serving repeated prompts from cache"""
+    # prefix holds static instructions sent ahead of the variable prompt for provider prompt caching
+    key = hashlib.sha256(f"{model}|{system}|{prefix}{prompt}".encode()).hexdigest()
+    cached = await cache_get(key)
+    if cached is not None:
+        return cached
+
+    # Semantic lookups are scoped per stage, model, instructions (system prompt and
+    # prefix) and cache_scope, each stage with its own threshold; only the variable
+    # prompt is embedded
+    threshold = SEMANTIC_CACHE_THRESHOLDS.get(stage)
+    instructions_hash = hashlib.sha256(f"{system}|{prefix}|{cache_scope}".encode()).hexdigest()
+    namespace = f"{stage}|{model}|{instructions_hash}"
+    embedding = None
+    if _EMBEDDER is not None and threshold is not None:
+        embedding = await asyncio.to_thread(embed_prompt, prompt)
+        cached = semantic_cache_search(namespace, embedding, threshold)
+        if cached is not None:
+            return cached
+
+    if provider == "anthropic":
+        response = await call_anthropic(model, system, prompt, prefix, max_tokens)
+    elif provider == "openai":
+        response = await call_openai(model, system, prompt, prefix, max_tokens)
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+
+    if os.getenv(PROVIDER_API_KEYS[provider]):
+        await cache_set(key, response)
+        if embedding is not None:
+            semantic_cache_add(namespace, embedding, response)
 
-    return report
+    return response
 
 
-async def call_llm(model: str, provider: str, system: str, prompt: str) -> str:
-    """Call LLM API based on provider"""
+async def stream_llm(
+        model: str,
+        provider: str,
+        system: str,
+        prompt: str,
+        prefix: str = ""
+):
+    """Stream LLM response text deltas as they arrive, caching the full response"""
+    key = hashlib.sha256(f"{model}|{system}|{prefix}{prompt}".encode()).hexdigest()
+    cached = await cache_get(key)
+    if cached is not None:
+        yield cached
+        return
 
     if provider == "anthropic":
-        return await call_anthropic(model, system, prompt)
+        deltas = stream_anthropic(model, system, prompt, prefix)
     elif provider == "openai":
-        return await call_openai(model, system, prompt)
+        deltas = stream_openai(model, system, prompt, prefix)
     else:
         raise ValueError(f"Unknown provider: {provider}")
 
+    chunks = []
+    async for delta in deltas:
+        chunks.append(delta)
+        yield delta
+
+    # Provider streams raise unless they finished cleanly, so only complete replies get here
+    if os.getenv(PROVIDER_API_KEYS[provider]):
+        await cache_set(key, "".join(chunks))
 
-async def call_anthropic(model: str, system: str, prompt: str) -> str:
+
+async def parse_json_body(content: bytes):
+    """Decode a JSON response body, off the event loop when it is large"""
+    if len(content) > LARGE_RESPONSE_BYTES:
+        return await asyncio.to_thread(orjson.loads, content)
+    return orjson.loads(content)
+
+
+def build_anthropic_request(
+        api_key: str,
+        model: str,
+        system: str,
+        prompt: str,
+        prefix: str,
+        stream: bool = False,
+        max_tokens: int = 4096
+) -> dict:
+    """Build Anthropic request headers and body, marking the system prompt and static prefix as cacheable"""
+    content = [{"type": "text", "text": prompt}]
+    if prefix:
+        content.insert(0, {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}})
+
+    return {
+        "headers": {
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "anthropic-beta": "prompt-caching-2024-07-31",
+            "content-type": "application/json"
+        },
+        "content": orjson.dumps({
+            "model": model,
+            "max_tokens": max_tokens,
+            "system": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+            "messages": [{"role": "user", "content": content}],
+            "stream": stream
+        })
+    }
+
+
+def build_openai_request(
+        api_key: str,
+        model: str,
+        system: str,
+        prompt: str,
+        prefix: str,
+        stream: bool = False,
+        max_tokens: int = 4096
+) -> dict:
+    """Build OpenAI request headers and body"""
+    # OpenAI caches shared prefixes automatically, so the static prefix just leads the message
+    return {
+        "headers": {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        "content": orjson.dumps({
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prefix + prompt}
+            ],
+            "max_tokens": max_tokens,
+            "stream": stream
+        })
+    }
+
+
+async def call_anthropic(model: str, system: str, prompt: str, prefix: str = "", max_tokens: int = 4096) -> str:
     """Call Anthropic API"""
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         # Return mock response for demo
         return f"[Demo Mode - Set ANTHROPIC_API_KEY for real responses]\n\nThis is a placeholder summary for the content. In production, Claude would analyze the content and provide detailed insights."
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json"
-            },
-            json={
-                "model": model,
-                "max_tokens": 4096,
-                "system": system,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-        )
+    response = await _ANTHROPIC_CLIENT.post(
+        "/v1/messages",
+        **build_anthropic_request(api_key, model, system, prompt, prefix, max_tokens=max_tokens)
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"Anthropic API error: {response.text}")
+
+    data = await parse_json_body(response.content)
+    return data["content"][0]["text"]
+
 
+async def stream_anthropic(model: str, system: str, prompt: str, prefix: str = ""):
+    """Stream text deltas from the Anthropic API"""
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        yield await call_anthropic(model, system, prompt, prefix)
+        return
+
+    request = build_anthropic_request(api_key, model, system, prompt, prefix, stream=True)
+
+    async with _ANTHROPIC_CLIENT.stream("POST", "/v1/messages", **request) as response:
         if response.status_code != 200:
+            await response.aread()
             raise Exception(f"Anthropic API error: {response.text}")
 
-        data = response.json()
-        return data["content"][0]["text"]
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = orjson.loads(line[len("data: "):])
+            if event.get("type") == "error":
+                raise Exception(f"Anthropic API error: {event.get('error')}")
+            if event.get("type") == "message_stop":
+                return
+            if event.get("type") == "content_block_delta":
+                text = event["delta"].get("text")
+                if text:
+                    yield text
+
+    # Only message_stop marks a complete response
+    raise Exception("Anthropic API error: stream ended before message_stop")
 
 
-async def call_openai(model: str, system: str, prompt: str) -> str:
+async def call_openai(model: str, system: str, prompt: str, prefix: str = "", max_tokens: int = 4096) -> str:
     """Call OpenAI API"""
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return f"[Demo Mode - Set OPENAI_API_KEY for real responses]\n\nThis is a placeholder summary."
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 4096
-            }
-        )
+    response = await _OPENAI_CLIENT.post(
+        "/v1/chat/completions",
+        **build_openai_request(api_key, model, system, prompt, prefix, max_tokens=max_tokens)
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"OpenAI API error: {response.text}")
+
+    data = await parse_json_body(response.content)
+    return data["choices"][0]["message"]["content"]
+
+
+async def stream_openai(model: str, system: str, prompt: str, prefix: str = ""):
+    """Stream text deltas from the OpenAI API"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        yield await call_openai(model, system, prompt, prefix)
+        return
+
+    request = build_openai_request(api_key, model, system, prompt, prefix, stream=True)
 
+    async with _OPENAI_CLIENT.stream("POST", "/v1/chat/completions", **request) as response:
         if response.status_code != 200:
+            await response.aread()
             raise Exception(f"OpenAI API error: {response.text}")
 
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            payload = line[len("data: "):]
+            if payload == "[DONE]":
+                return
+            event = orjson.loads(payload)
+            if event.get("error"):
+                raise Exception(f"OpenAI API error: {event['error']}")
+            choices = event.get("choices")
+            if choices:
+                text = choices[0].get("delta", {}).get("content")
+                if text:
+                    yield text
+
+    # Only [DONE] marks a complete response
+    raise Exception("OpenAI API error: stream ended before [DONE]")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+from main import extract_json
+
+
+def test_extract_json_object():
+    assert extract_json('Here you go: {"a": 1} Thanks') == {"a": 1}
+
+
+def test_extract_json_array():
+    assert extract_json('[{"url": "u", "summary": "s"}]', "[", "]") == [{"url": "u", "summary": "s"}]
+
+
+def test_extract_json_brackets_inside_strings():
+    assert extract_json('{"a": "}{", "b": "say \\"}\\""}') == {"a": "}{", "b": 'say "}"'}
+
+
+def test_extract_json_skips_balanced_prose():
+    assert extract_json('As {noted} above: {"b": [1]}') == {"b": [1]}
+
+
+def test_extract_json_skips_unbalanced_object_bracket():
+    assert extract_json('Use a { to begin. {"a":1}') == {"a": 1}
+
+
+def test_extract_json_skips_unbalanced_array_bracket():
+    assert extract_json('Pages [1-5 follow: [{"url":"u"}]', "[", "]") == [{"url": "u"}]
+
+
+def test_extract_json_none_without_json():
+    assert extract_json("No JSON here {") is None
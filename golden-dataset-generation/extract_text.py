@@ -1,18 +1,30 @@
 import os
-from PyPDF2 import PdfReader
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
 
-def extract_text_from_pdfs(pdf_dir: str) -> str:
+import pypdfium2 as pdfium
+
+def extract_text_from_pdf(path: str) -> str:
     text = []
-    for file in os.listdir(pdf_dir):
-        if file.endswith(".pdf"):
-            reader = PdfReader(os.path.join(pdf_dir, file))
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text.append(page_text)
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for page in pdf:
+            page_text = page.get_textpage().get_text_range()
+            if page_text:
+                text.append(page_text)
+    finally:
+        pdf.close()
     return "\n".join(text)
 
+def extract_text_from_pdfs(pdf_dir: str) -> Iterator[str]:
+    paths = [os.path.join(pdf_dir, file) for file in os.listdir(pdf_dir) if file.endswith(".pdf")]
+    # PDFs are parsed in parallel; text is yielded one PDF at a time, in order
+    with ProcessPoolExecutor() as executor:
+        for pdf_text in executor.map(extract_text_from_pdf, paths):
+            if pdf_text:
+                yield pdf_text
+
 if __name__ == "__main__":
-    corpus = extract_text_from_pdfs("pdfs")
     with open("corpus.txt", "w", encoding="utf-8") as f:
-        f.write(corpus)
\ No newline at end of file
+        for i, pdf_text in enumerate(extract_text_from_pdfs("pdfs")):
+            f.write(("\n" if i else "") + pdf_text)
@@ -1,19 +1,14 @@
-import json
+import ijson
+import orjson
 
 
-
-
-with open("seed_qa.json", "r", encoding="utf-8") as f:
-    questions = json.load(f)
-
-qa_pairs = questions["questions"]
-
-with open("finetune_data.jsonl", "w", encoding="utf-8") as f:
-    for qa in qa_pairs:
+# Stream one QA pair at a time so memory stays flat regardless of dataset size
+with open("seed_qa.json", "rb") as fin, open("finetune_data.jsonl", "wb") as fout:
+    for qa in ijson.items(fin, "questions.item"):
         record = {
             "messages": [
                 {"role": "user", "content": qa["question"]},
                 {"role": "assistant", "content": qa["answer"]}
             ]
         }
-        f.write(json.dumps(record) + "\n")
\ No newline at end of file
+        fout.write(orjson.dumps(record) + b"\n")
\ No newline at end of file